@@ -27,11 +27,10 @@ def create_iteration_value_graph(stats: IterationStats, value_name, name, basefo
     iteration_values = []
     times = []
 
-    def add_variation(iteration_number, iteration_time, iteration_value, values):
-        iteration_values.append(iteration_value)
-        times.append(iteration_time)
-
-    stats.load_and_run_analysis(add_variation)
+    # only the times and values are read, not the value vectors
+    for batch in stats.read_batches(columns=('time', 'i_value')):
+        iteration_values.extend(batch['i_value'].tolist())
+        times.extend(batch['time'].tolist())
 
     plot.figure(1, clear=True)
     plot.title(name)
@@ -54,21 +53,15 @@ def create_grid_world_state_graphs_value_iteration(world: GridWorld, stats: Iter
 
     on_iteration = functools.partial(__create_world_graph__, world, transitions, iterations, name, base_folder, get_policy, None)
 
-    stats.load_and_run_analysis(on_iteration)
+    __run_on_iterations__(stats, iterations, on_iteration)
 
 
 def get_vi_policy(world: GridWorld, stats: IterationStats, transitions, iteration):
-    policy = []
-    def get_policy(iteration_number, iteration_time, iteration_value, values):
-        if iteration_number == iteration:
-            Q = numpy.empty((5, len(world.all_states) + 1))
-            for aa in range(0, 5):
-                Q[aa] = transitions[aa].dot(values)
-            policy.append(Q.argmax(axis=0))
-    
-    stats.load_and_run_analysis(get_policy)
-
-    return policy[0]
+    iteration_number, iteration_time, iteration_value, values = stats.get_iteration(iteration)
+    Q = numpy.empty((5, len(world.all_states) + 1))
+    for aa in range(0, 5):
+        Q[aa] = transitions[aa].dot(values)
+    return Q.argmax(axis=0)
     
 def create_grid_world_state_graphs_policy_iteration(world: GridWorld, stats: IterationStats, transitions, name, base_folder, iterations=None):
 
@@ -80,17 +73,11 @@ def create_grid_world_state_graphs_policy_iteration(world: GridWorld, stats: Ite
     
     on_iteration = functools.partial(__create_world_graph__, world, transitions, iterations, name, base_folder, get_policy, get_value)
 
-    stats.load_and_run_analysis(on_iteration)
+    __run_on_iterations__(stats, iterations, on_iteration)
 
 def get_pi_policy(world: GridWorld, stats: IterationStats, transitions, iteration):
-    policy = []
-    def get_policy(iteration_number, iteration_time, iteration_value, values):
-        if iteration_number == iteration:
-            policy.append(values)
-    
-    stats.load_and_run_analysis(get_policy)
-
-    return policy[0]
+    iteration_number, iteration_time, iteration_value, values = stats.get_iteration(iteration)
+    return values
 
 
 def create_grid_world_state_graphs_q_learning(world: GridWorld, stats: IterationStats, name, base_folder, iterations=None):
@@ -115,7 +102,7 @@ def create_grid_world_state_graphs_q_learning(world: GridWorld, stats: Iteration
 
     on_iteration = functools.partial(__create_world_graph__, world, None, iterations, name, base_folder, get_policy, get_value)
 
-    stats.load_and_run_analysis(on_iteration)
+    __run_on_iterations__(stats, iterations, on_iteration)
 
 def compare_policies(world: GridWorld, policy_a, policy_b, base_folder, name):
     differences = {}
@@ -153,6 +140,19 @@ def compare_policies(world: GridWorld, policy_a, policy_b, base_folder, name):
         plot.savefig('{}/{}_T{}'.format(base_folder, name.replace(' ', '_').lower(), layer_hash))
 
 
+def __run_on_iterations__(stats, iterations, on_iteration):
+    # only the iterations asked for are read, through the index of the stats
+    if iterations is None:
+        stats.load_and_run_analysis(on_iteration)
+        return
+    for iteration in iterations:
+        try:
+            iteration_info = stats.get_iteration(iteration)
+        except KeyError:
+            continue
+        on_iteration(*iteration_info)
+
+
 def __create_world_graph__(world, transitions, iterations, name, base_folder, get_policy, get_value, iteration_number, iteration_time, iteration_value, values):
     if iterations is not None and iteration_number not in iterations:
         return
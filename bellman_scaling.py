@@ -0,0 +1,78 @@
+import cmdptoolbox.mdp
+import numpy
+import scipy.sparse
+import multiprocessing
+import time
+import sys
+import os
+
+# the numbers of states of the models that are timed, and the number of
+# actions and of next states of each state-action pair, which are about those
+# of the grid worlds
+STATE_COUNTS = [10 ** 4, 10 ** 5, 10 ** 6]
+N_ACTIONS = 5
+N_NEXT_STATES = 4
+N_REPEATS = 20
+
+def random_model(S, seed=0):
+    # a random sparse model with N_NEXT_STATES next states for each state and
+    # action, mostly neighbours of the state as in a grid world
+    random = numpy.random.RandomState(seed)
+    transitions = []
+    for _ in range(N_ACTIONS):
+        offsets = random.randint(-100, 101, size=(S, N_NEXT_STATES))
+        indices = (numpy.arange(S)[:, None] + offsets) % S
+        data = random.random_sample((S, N_NEXT_STATES))
+        data /= data.sum(axis=1, keepdims=True)
+        indptr = numpy.arange(0, S * N_NEXT_STATES + 1, N_NEXT_STATES)
+        matrix = scipy.sparse.csr_matrix((data.ravel(), indices.ravel(), indptr), shape=(S, S))
+        matrix.sum_duplicates()
+        transitions.append(matrix)
+    reward = random.random_sample((S, N_ACTIONS))
+    return cmdptoolbox.mdp.CompiledMDP(transitions, reward, skip_check=True)
+
+def time_bellman_operator(model, n_jobs):
+    # the mean time of a Bellman operator, once the pool has been started and
+    # has applied it once (the solvers only start it in run)
+    V = numpy.random.random_sample(model.S)
+    if n_jobs == 1:
+        pi = cmdptoolbox.mdp.PolicyIteration(model, None, 0.99)
+        apply = lambda: pi._bellmanOperator(V)
+        pool = None
+    else:
+        pool = cmdptoolbox.mdp._BellmanPool(model._Pstack, model._Rstack, model.S, model.A, n_jobs)
+        apply = lambda: pool.apply(V, 0.99)
+        apply()
+    start = time.time()
+    for _ in range(N_REPEATS):
+        apply()
+    elapsed = (time.time() - start) / N_REPEATS
+    if pool is not None:
+        pool.close()
+    return elapsed
+
+def main(max_jobs=None):
+    if max_jobs is None:
+        max_jobs = multiprocessing.cpu_count()
+    job_counts = [1]
+    while job_counts[-1] * 2 <= max_jobs:
+        job_counts.append(job_counts[-1] * 2)
+    if job_counts[-1] != max_jobs:
+        job_counts.append(max_jobs)
+
+    if not os.path.exists('scaling_results'):
+        os.makedirs('scaling_results')
+    with open('scaling_results/bellman_scaling.csv', 'w') as results:
+        results.write('states workers seconds speedup\n')
+        for S in STATE_COUNTS:
+            model = random_model(S)
+            serial = None
+            for n_jobs in job_counts:
+                seconds = time_bellman_operator(model, n_jobs)
+                if serial is None:
+                    serial = seconds
+                print('S={}\tworkers={}\t{:.6f} s\tspeedup {:.2f}'.format(S, n_jobs, seconds, serial / seconds))
+                results.write('{} {} {} {}\n'.format(S, n_jobs, seconds, serial / seconds))
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else None)
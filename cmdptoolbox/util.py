@@ -53,6 +53,7 @@ isStochastic
 # POSSIBILITY OF SUCH DAMAGE.
 
 import numpy as _np
+import scipy.sparse as _sp
 
 import mdptoolbox.error as _error
 
@@ -63,6 +64,12 @@ _MDPERR = {
     "A transition probability matrix must be square, with dimensions S×S.",
 "mat_stoch" :
     "Each row of a transition probability matrix must sum to one (1).",
+"rows_nonneg" :
+    "Transition probabilities must be non-negative, but these rows have "
+    "negative ones: %s",
+"rows_stoch" :
+    "Each row of a transition probability matrix must sum to one (1), but "
+    "these rows do not: %s",
 "obj_shape" :
     "Object arrays for transition probabilities and rewards "
     "must have only 1 dimension: the number of actions A. Each element of "
@@ -118,6 +125,66 @@ def _checkRewardsListLike(reward, n_actions, n_states):
         raise _error.InvalidError(_MDPERR["R_shape"])
     return dim1, dim2, dim3
 
+def _stackRows(P, n_actions, n_states):
+    """Stack the transition matrices of all the actions into one matrix.
+
+    Row ``a * S + s`` of the stacked matrix is row ``s`` of ``P[a]``, as in
+    the stacked transitions of the solvers. If any of the matrices is sparse
+    then the stack is a CSR matrix, and an (A, S, S) array is reshaped
+    without being copied.
+
+    """
+    if any(_sp.issparse(P[aa]) for aa in range(n_actions)):
+        return _sp.vstack([_sp.csr_matrix(P[aa]) for aa in range(n_actions)],
+                          format="csr")
+    if isinstance(P, _np.ndarray) and P.ndim == 3:
+        return P.reshape(n_actions * n_states, n_states)
+    return _np.concatenate([_np.asarray(P[aa]) for aa in range(n_actions)])
+
+def _checkRows(matrix):
+    """Find the rows of ``matrix`` that are not stochastic or non-negative.
+
+    A sparse matrix is checked through the ``data`` and ``indptr`` arrays of
+    its CSR form, so it is never densified and no boolean matrix is built.
+
+    Returns
+    =======
+    not_stochastic : numpy.ndarray
+        The indices of the rows that do not sum to one.
+    negative : numpy.ndarray
+        The indices of the rows that have a negative element.
+
+    """
+    tolerance = 10*_np.spacing(_np.float64(1))
+    if _sp.issparse(matrix):
+        matrix = _sp.csr_matrix(matrix)
+        if not matrix.has_canonical_format:
+            matrix = matrix.copy()
+            matrix.sum_duplicates()
+        # the row sums come from one pass over data, and the rows of the
+        # negative elements are found from their positions in it
+        sums = matrix.dot(_np.ones(matrix.shape[1]))
+        negative = _np.unique(_np.searchsorted(
+            matrix.indptr, _np.flatnonzero(matrix.data < 0), side="right") - 1)
+    else:
+        matrix = _np.asarray(matrix)
+        sums = matrix.sum(axis=1)
+        negative = _np.flatnonzero(matrix.min(axis=1) < 0)
+    not_stochastic = _np.flatnonzero(_np.abs(sums - 1) > tolerance)
+    return not_stochastic, negative
+
+def _formatRows(rows, limit=20):
+    """Format a list of (action, state) rows for an error message.
+
+    Only the first ``limit`` rows are listed, followed by how many more
+    there are.
+
+    """
+    text = ", ".join("P[%d][%d]" % row for row in rows[:limit])
+    if len(rows) > limit:
+        text += " ... and %d more" % (len(rows) - limit)
+    return text
+
 def isSquare(matrix):
     """Check that ``matrix`` is square.
 
@@ -147,12 +214,8 @@ def isStochastic(matrix):
         ``True`` if ``matrix`` is row stochastic, ``False`` otherwise.
 
     """
-    try:
-        absdiff = (_np.abs(matrix.sum(axis=1) - _np.ones(matrix.shape[0])))
-    except AttributeError:
-        matrix = _np.array(matrix)
-        absdiff = (_np.abs(matrix.sum(axis=1) - _np.ones(matrix.shape[0])))
-    return (absdiff.max() <= 10*_np.spacing(_np.float64(1)))
+    not_stochastic, negative = _checkRows(matrix)
+    return not_stochastic.size == 0
 
 def isNonNegative(matrix):
     """Check that ``matrix`` is row non-negative.
@@ -163,18 +226,9 @@ def isNonNegative(matrix):
         ``True`` if ``matrix`` is non-negative, ``False`` otherwise.
 
     """
-    try:
-        if (matrix >= 0).all():
-            return True
-    except (NotImplementedError, AttributeError, TypeError):
-        try:
-            if (matrix.data >= 0).all():
-                return True
-        except AttributeError:
-            matrix = _np.array(matrix)
-            if (matrix.data >= 0).all():
-                return True
-    return False
+    if _sp.issparse(matrix):
+        return bool((matrix.data >= 0).all())
+    return bool((_np.asarray(matrix) >= 0).all())
 
 def checkSquareStochastic(matrix):
     """Check if ``matrix`` is a square and row-stochastic.
@@ -226,7 +280,12 @@ def check(P, R):
 
     Notes
     -----
-    Raises an error if ``P`` and ``R`` do not define a MDP.
+    Raises an error if ``P`` and ``R`` do not define a MDP. The rows of all
+    the transition matrices are checked before an error is raised, and the
+    error lists the rows that do not sum to one or, if they all do, the rows
+    that have a negative probability. The message names the first 20 of
+    them, and all of them are kept in the ``rows`` attribute of the error as
+    a list of (action, state) pairs.
 
     Examples
     --------
@@ -289,9 +348,26 @@ def check(P, R):
         msg = "The number of actions must agree in P and R."
     if msg:
         raise _error.InvalidError(msg)
-    # Check that the P's are square, stochastic and non-negative
-    for aa in range(aP):
-        checkSquareStochastic(P[aa])
+    # Check that the P's are square, stochastic and non-negative. They all
+    # have the same shape, and their rows are checked in one pass over the
+    # stacked (A*S, S) matrix, whose row a*S + s is the (action, state) row
+    # (a, s).
+    if sP0 != sP1:
+        raise _error.SquareError
+    rows_stoch, rows_neg = _checkRows(_stackRows(P, aP, sP0))
+    not_stochastic = list(zip(*(rows.tolist()
+                                for rows in _np.divmod(rows_stoch, sP0))))
+    negative = list(zip(*(rows.tolist() for rows in _np.divmod(rows_neg, sP0))))
+    if not_stochastic:
+        error = _error.StochasticError(
+            _MDPERR["rows_stoch"] % _formatRows(not_stochastic))
+        error.rows = not_stochastic
+        raise error
+    if negative:
+        error = _error.NonNegativeError(
+            _MDPERR["rows_nonneg"] % _formatRows(negative))
+        error.rows = negative
+        raise error
 
 def getSpan(W):
     """Return the span of W
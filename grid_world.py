@@ -1,5 +1,5 @@
 from mdp import MDP, MDPState
-import copy
+import collections
 import csv
 import numpy
 import scipy.sparse
@@ -9,11 +9,19 @@ class GridWorld(MDP):
 
     def __init__(self, grid_filename, normal_reward, goal_reward=10, trap_reward=-10, pit_reward=-5, include_treasure=True):
         super().__init__()
+        # the treasure layers that have been built so far, by treasure hash,
+        # see __get_layer__
         self.grid = {}
         self.all_states = []
         self.width = 0
         self.height = 0
-        self.__read_grid_file__(grid_filename, normal_reward, goal_reward, trap_reward, pit_reward, include_treasure)
+        self.__tile_types = []
+        self.__treasure_count = 0
+        self.__rewards = (normal_reward, goal_reward, trap_reward, pit_reward)
+        self.__include_treasure = include_treasure
+        self.__state_index = {}
+        self.__read_grid_file__(grid_filename)
+        self.__enumerate_states__()
 
     def print(self, printline, **kwargs):
         if 'x' in kwargs:
@@ -108,10 +116,14 @@ class GridWorld(MDP):
                 if a < len(actions):
                     action = actions[a]
                     for transition in action[1]:
+                        if transition[0] == 0.0:
+                            # the enumeration skips states that can only be
+                            # reached with a probability of 0
+                            continue
                         if transition[1] is None:
                             t_index = i
                         else:
-                            t_index = self.all_states.index(transition[1])
+                            t_index = self.__state_index[transition[1]]
                         probs.append(transition[0])
                         row_ind.append(i)
                         col_ind.append(t_index)
@@ -166,55 +178,75 @@ class GridWorld(MDP):
         rewards[len(self.all_states)] = 0.0
         return rewards
 
-    def __read_grid_file__(self, grid_filename, normal_reward, goal_reward, trap_reward, pit_reward, include_treasure):
+    def __read_grid_file__(self, grid_filename):
         with open(grid_filename, mode="r") as f:
             size_pair = f.readline()
             sizes = size_pair.split(',')
             self.width = int(sizes[0])
             self.height = int(sizes[1])
-            temp_grid = []
             treasure_count = 0
             for _ in range(0, self.height):
                 line = f.readline()
-                grid_line = []
+                row = []
                 for x in range(0, self.width):
-                    grid_line.append(line[x])
-                    if line[x] == 'T':
+                    tile_type = GridWorldTile.TILE_TYPE[line[x]]
+                    if tile_type == GridWorldTile.TREASURE:
+                        tile_type += treasure_count
                         treasure_count += 1
-                temp_grid.append(grid_line)
-            treasure_state = []
-            for _ in range(0, treasure_count):
-                treasure_state.append(False)
-            treasure_states = __enumerate_states__(treasure_state)
-            for treasure_state in treasure_states:
-                captured_treasure = treasure_state.count(True)
-                treasure_hash = __get_treasure_hash__(treasure_state)
-                this_grid = []
-                treasure_current = 0
-                for y in range(0, self.height):
-                    row = []
-                    for x in range(0, self.width):
-                        tile_char = temp_grid[y][x]
-                        tile_type = GridWorldTile.TILE_TYPE[tile_char]
-                        if tile_type == GridWorldTile.TREASURE:
-                            tile_type += treasure_current
-                            treasure_current += 1
-                        tile = GridWorldTile(x, y, tile_type, treasure_state, self, include_treasure)
-                        if tile_type == GridWorldTile.GOAL:
-                            tile.reward = goal_reward + goal_reward * captured_treasure
-                        elif tile_type == GridWorldTile.TRAP:
-                            tile.reward = trap_reward
-                        elif tile_type == GridWorldTile.PIT:
-                            tile.reward = pit_reward
-                        else:
-                            tile.reward = normal_reward
-                        row.append(tile)
-                        if tile.tile_type == GridWorldTile.START and treasure_hash == 0:
-                            self.all_states.insert(0, tile)
-                        elif tile.tile_type != GridWorldTile.IMPASSABLE:
-                            self.all_states.append(tile)
-                    this_grid.append(row)
-                self.grid[treasure_hash] = this_grid
+                    row.append(tile_type)
+                self.__tile_types.append(row)
+            self.__treasure_count = treasure_count
+
+    def __get_layer__(self, treasure_hash):
+        # the layers are only built once a state in them is reached, as there
+        # are 2^k of them for k treasures
+        if treasure_hash in self.grid:
+            return self.grid[treasure_hash]
+        normal_reward, goal_reward, trap_reward, pit_reward = self.__rewards
+        treasure_state = [treasure_hash & (1 << i) != 0 for i in range(0, max(self.__treasure_count, 1))]
+        captured_treasure = treasure_state.count(True)
+        this_grid = []
+        for y in range(0, self.height):
+            row = []
+            for x in range(0, self.width):
+                tile_type = self.__tile_types[y][x]
+                tile = GridWorldTile(x, y, tile_type, treasure_state, self, self.__include_treasure)
+                if tile_type == GridWorldTile.GOAL:
+                    tile.reward = goal_reward + goal_reward * captured_treasure
+                elif tile_type == GridWorldTile.TRAP:
+                    tile.reward = trap_reward
+                elif tile_type == GridWorldTile.PIT:
+                    tile.reward = pit_reward
+                else:
+                    tile.reward = normal_reward
+                row.append(tile)
+            this_grid.append(row)
+        self.grid[treasure_hash] = this_grid
+        return this_grid
+
+    def __enumerate_states__(self):
+        # The states are the tiles that can be reached from the start tile of
+        # the layer without treasure, which is the first state. The layers of
+        # the treasures are built as "get treasure" actions reach them. The
+        # states are ordered by layer and then row by row.
+        layer = self.__get_layer__(0)
+        starts = [tile for row in layer for tile in row if tile.tile_type == GridWorldTile.START]
+        if len(starts) == 0:
+            starts = [tile for row in layer for tile in row if tile.tile_type != GridWorldTile.IMPASSABLE]
+        reached = set(starts)
+        queue = collections.deque(starts)
+        while queue:
+            tile = queue.popleft()
+            for action in tile.get_actions():
+                for probability, next_tile in action[1]:
+                    if probability > 0.0 and next_tile is not None and next_tile not in reached:
+                        reached.add(next_tile)
+                        queue.append(next_tile)
+        start = starts[0] if starts[0].tile_type == GridWorldTile.START else None
+        self.all_states = sorted((tile for tile in reached if tile is not start), key=lambda tile: (tile.t_hash, tile.y, tile.x))
+        if start is not None:
+            self.all_states.insert(0, start)
+        self.__state_index = {tile: i for i, tile in enumerate(self.all_states)}
 
 class GridWorldTile(MDPState):
 
@@ -400,7 +432,7 @@ class GridWorldTile(MDPState):
                 new_treasure_state = list(self.treasure_state)
                 new_treasure_state[treasure_id] = True
                 new_treasure_hash = __get_treasure_hash__(new_treasure_state)
-                self.actions.append(('get treasure {}'.format(treasure_id), [(0.8, self.grid_world.grid[new_treasure_hash][self.y][self.x]), (0.2, self)]))
+                self.actions.append(('get treasure {}'.format(treasure_id), [(0.8, self.grid_world.__get_layer__(new_treasure_hash)[self.y][self.x]), (0.2, self)]))
         if add_fake and self.include_treasure:
             self.actions.append(GridWorldTile.__create_no_treasure_action__(tile_type, north_neighbor, east_neighbor, south_neighbor, west_neighbor, self))
 
@@ -454,18 +486,3 @@ def __get_treasure_hash__(treasure_state):
     for i, s in enumerate(treasure_state):
         treasure_hash += (2**i if s else 0)
     return treasure_hash
-
-def __enumerate_states__(state, i=0):
-    if i >= len(state):
-        if len(state) == 0:
-            return [[False]]
-        return [state]
-    other_states = __enumerate_states__(state, i + 1)
-    states_to_return = []
-    for other in other_states:
-        o = copy.deepcopy(other)
-        o[i] = False
-        states_to_return.append(o)
-        other[i] = True
-        states_to_return.append(other)
-    return states_to_return
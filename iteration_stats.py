@@ -1,31 +1,144 @@
+import contextlib
 import csv
+import functools
+import io
+import os
+import struct
+import zlib
+import numpy
 from threading import Thread
-from queue import Queue, Empty
+from queue import Queue, Empty, Full
 
 
 class IterationStats:
 
-    def __init__(self, filename, values_type=float, value_type=float, dims=1):
+    # A binary stats file starts with the magic, dims and the length of the
+    # value vectors, followed by one fixed width record per iteration: the
+    # iteration number, time and value and then the value vectors as one
+    # contiguous block of float64.
+    BINARY_MAGIC = b'ITSTATS1'
+    BINARY_HEADER = struct.Struct('<8sqq')
+    BINARY_RECORD_HEADER = struct.Struct('<qdd')
+    # A compressed stats file starts with the magic, dims, the length of the
+    # value vectors and the keyframe interval, followed by chunks of up to
+    # keyframe interval iterations. A chunk is its number of iterations and
+    # length and then, compressed with zlib, the headers of its iterations and
+    # the value vectors of its first iteration (the keyframe) and of the rest
+    # xor-ed with the one before, stored byte plane by byte plane.
+    COMPRESSED_MAGIC = b'ITSTATZ1'
+    COMPRESSED_HEADER = struct.Struct('<8sqqq')
+    CHUNK_HEADER = struct.Struct('<qq')
+    CHUNK_RECORD_DTYPE = numpy.dtype([('number', '<i8'), ('time', '<f8'), ('i_value', '<f8')])
+    # The index file next to a stats file holds the iteration number and the
+    # byte offset in the stats file of every iteration.
+    # It starts with the size and modification time of the stats file it was
+    # written for, so an index left behind by an older stats file is rebuilt.
+    INDEX_MAGIC = b'ITSTIDX1'
+    INDEX_HEADER = struct.Struct('<8sqq')
+    INDEX_DTYPE = numpy.dtype([('number', '<i8'), ('offset', '<i8')])
+
+    def __init__(self, filename, values_type=float, value_type=float, dims=1, storage='csv', keyframe_interval=64):
+        assert storage in ('csv', 'binary', 'compressed'), "'storage' must be 'csv', 'binary' or 'compressed'."
+        assert keyframe_interval > 0, "'keyframe_interval' must be greater than 0."
         self.filename = filename
         self.iterations = []
         self.write_thread = None
         self.values_type = values_type
         self.value_type = value_type
         self.dims = dims
+        self.storage = storage
+        self.keyframe_interval = keyframe_interval
+        self.index_filename = filename + '.idx'
     
     def start_writing(self):
         open(self.filename, 'w').close()
-        self.write_thread = IterationStats.WriteThread(self.filename, self.dims)
+        open(self.index_filename, 'w').close()
+        self.write_thread = IterationStats.WriteThread(self.filename, self.dims, self.storage, index_filename=self.index_filename, keyframe_interval=self.keyframe_interval)
         self.write_thread.start()
 
     def save_iteration(self, iteration_number, iteration_time, iteration_value, values):
+        if self.storage != 'csv':
+            # the writer runs behind, so it gets a copy of values that the
+            # caller can't change in the meantime
+            values = numpy.array(values, dtype='<f8')
         self.write_thread.write(iteration_number, iteration_time, iteration_value, values)
 
     def done_writing(self):
         self.write_thread.done()
         self.write_thread.join()
+        self.write_thread.check_error()
+
+    def load_records(self):
+        # returns the records of a binary stats file as a read only memory
+        # map, the values of each record are views into it
+        with open(self.filename, 'rb') as f:
+            header = f.read(IterationStats.BINARY_HEADER.size)
+        if len(header) < IterationStats.BINARY_HEADER.size:
+            return numpy.empty(0, dtype=IterationStats.record_dtype(self.dims, 0))
+        magic, dims, n = IterationStats.BINARY_HEADER.unpack(header)
+        assert magic == IterationStats.BINARY_MAGIC, "'{}' is not a binary stats file.".format(self.filename)
+        assert dims == self.dims, "'{}' holds {} value vectors per iteration, not {}.".format(self.filename, dims, self.dims)
+        dtype = IterationStats.record_dtype(dims, n)
+        # a record that is still being written is left out
+        count = (os.path.getsize(self.filename) - IterationStats.BINARY_HEADER.size) // dtype.itemsize
+        if count == 0:
+            return numpy.empty(0, dtype=dtype)
+        return numpy.memmap(self.filename, dtype=dtype, mode='r', offset=IterationStats.BINARY_HEADER.size, shape=(count,))
+
+    @staticmethod
+    def record_dtype(dims, n):
+        values_shape = (n,) if dims == 1 else (dims, n)
+        return numpy.dtype([('number', '<i8'), ('time', '<f8'), ('i_value', '<f8'), ('values', '<f8', values_shape)])
+
+    def __read_compressed_header__(self, f):
+        # returns the shape of the value vectors of each iteration
+        magic, dims, n, keyframe_interval = IterationStats.COMPRESSED_HEADER.unpack(f.read(IterationStats.COMPRESSED_HEADER.size))
+        assert magic == IterationStats.COMPRESSED_MAGIC, "'{}' is not a compressed stats file.".format(self.filename)
+        assert dims == self.dims, "'{}' holds {} value vectors per iteration, not {}.".format(self.filename, dims, self.dims)
+        return (n,) if dims == 1 else (dims, n)
+
+    def __read_chunk__(self, f, values_shape):
+        # returns the headers and values of the chunk at the position of f,
+        # or None if there is no (complete) chunk there
+        chunk_header = f.read(IterationStats.CHUNK_HEADER.size)
+        if len(chunk_header) < IterationStats.CHUNK_HEADER.size:
+            return None
+        count, length = IterationStats.CHUNK_HEADER.unpack(chunk_header)
+        data = f.read(length)
+        if len(data) < length:
+            return None
+        data = zlib.decompress(data)
+        headers = numpy.frombuffer(data, dtype=IterationStats.CHUNK_RECORD_DTYPE, count=count)
+        planes = numpy.frombuffer(data, dtype=numpy.uint8, offset=headers.nbytes).reshape(8, count, -1)
+        deltas = numpy.ascontiguousarray(planes.transpose(1, 2, 0)).view('<u8')[:, :, 0]
+        values = numpy.bitwise_xor.accumulate(deltas, axis=0).view('<f8')
+        return headers, values.reshape((count,) + values_shape)
+
+    def __read_compressed__(self):
+        # yields every iteration of a compressed stats file
+        with open(self.filename, 'rb') as f:
+            if os.path.getsize(self.filename) == 0:
+                return
+            values_shape = self.__read_compressed_header__(f)
+            while True:
+                chunk = self.__read_chunk__(f, values_shape)
+                if chunk is None:
+                    break
+                headers, values = chunk
+                for k, (number, time, i_value) in enumerate(headers.tolist()):
+                    yield number, time, i_value, values[k]
 
     def load_stats(self):
+        if self.storage == 'binary':
+            records = self.load_records()
+            values = records['values']
+            for k, (number, time, i_value) in enumerate(zip(records['number'].tolist(), records['time'].tolist(), records['i_value'].tolist())):
+                self.iterations.append({'number': number, 'time': time, 'i_value': i_value, 'values': values[k]})
+            return
+        if self.storage == 'compressed':
+            for number, time, i_value, values in self.__read_compressed__():
+                self.iterations.append({'number': number, 'time': time, 'i_value': i_value, 'values': values})
+            return
         with open(self.filename, 'r', newline='') as f:
             reader = csv.reader(f, delimiter=' ')
             while True:
@@ -54,6 +167,16 @@ class IterationStats:
             on_iteration(number, time, i_value, values)
     
     def load_and_run_analysis(self, on_iteration):
+        if self.storage == 'binary':
+            records = self.load_records()
+            values = records['values']
+            for k, (number, time, i_value) in enumerate(zip(records['number'].tolist(), records['time'].tolist(), records['i_value'].tolist())):
+                on_iteration(number, time, self.value_type(i_value), values[k])
+            return
+        if self.storage == 'compressed':
+            for number, time, i_value, values in self.__read_compressed__():
+                on_iteration(number, time, self.value_type(i_value), values)
+            return
         with open(self.filename, 'r', newline='') as f:
             reader = csv.reader(f, delimiter=' ')
             while True:
@@ -73,33 +196,377 @@ class IterationStats:
                         values.append([float(v) for v in values_str])
                 on_iteration(iteration_number, iteration_time, iteration_value, values)
 
+    def read_batches(self, batch_size=1024, columns=('number', 'time', 'i_value', 'values'), states=None):
+        # yields dicts of numpy arrays holding the asked for columns of at most
+        # batch_size iterations, 'values' has the iterations along its first
+        # axis and can be narrowed to some states with an index or slice.
+        # Columns that aren't asked for aren't parsed, or read at all where
+        # the format allows it.
+        header_columns = [column for column in columns if column != 'values']
+        with_values = 'values' in columns
+        if self.storage == 'binary':
+            records = self.load_records()
+            for start in range(0, len(records), batch_size):
+                batch = {column: records[column][start:start + batch_size] for column in header_columns}
+                if with_values:
+                    values = records['values'][start:start + batch_size]
+                    batch['values'] = values if states is None else values[..., states]
+                yield batch
+        elif self.storage == 'compressed':
+            yield from self.__read_compressed_batches__(batch_size, header_columns, with_values, states)
+        else:
+            yield from self.__read_csv_batches__(batch_size, header_columns, with_values, states)
+
+    def __read_compressed_batches__(self, batch_size, header_columns, with_values, states):
+        if os.path.getsize(self.filename) == 0:
+            return
+        headers_size = IterationStats.CHUNK_RECORD_DTYPE.itemsize
+        pending = []
+        with open(self.filename, 'rb') as f:
+            values_shape = self.__read_compressed_header__(f)
+            while True:
+                if with_values:
+                    chunk = self.__read_chunk__(f, values_shape)
+                    if chunk is None:
+                        break
+                    headers, values = chunk
+                    pending.append((headers, values if states is None else values[..., states]))
+                else:
+                    # only the headers at the start of the chunk are inflated
+                    chunk_header = f.read(IterationStats.CHUNK_HEADER.size)
+                    if len(chunk_header) < IterationStats.CHUNK_HEADER.size:
+                        break
+                    count, length = IterationStats.CHUNK_HEADER.unpack(chunk_header)
+                    data = f.read(length)
+                    if len(data) < length:
+                        break
+                    headers = numpy.frombuffer(zlib.decompressobj().decompress(data, count * headers_size), dtype=IterationStats.CHUNK_RECORD_DTYPE)
+                    pending.append((headers, None))
+                while sum(len(headers) for headers, _ in pending) >= batch_size:
+                    pending = yield from self.__yield_batch__(pending, batch_size, header_columns, with_values)
+        while pending:
+            pending = yield from self.__yield_batch__(pending, batch_size, header_columns, with_values)
+
+    def __yield_batch__(self, pending, batch_size, header_columns, with_values):
+        # yields the first batch_size iterations of the pending chunks and
+        # returns what is left of them
+        headers = numpy.concatenate([chunk_headers for chunk_headers, _ in pending])
+        batch = {column: headers[column][:batch_size] for column in header_columns}
+        rest = []
+        if len(headers) > batch_size:
+            rest.append((headers[batch_size:], None))
+        if with_values:
+            values = numpy.concatenate([chunk_values for _, chunk_values in pending])
+            batch['values'] = values[:batch_size]
+            if rest:
+                rest[0] = (rest[0][0], values[batch_size:])
+        yield batch
+        return rest
+
+    def __read_csv_batches__(self, batch_size, header_columns, with_values, states):
+        positions = {'number': 0, 'time': 1, 'i_value': 2}
+        with open(self.filename, 'rb') as f:
+            if with_values:
+                offsets = None
+            else:
+                # the index lets the value rows be skipped without reading them
+                offsets = self.load_index()['offset'].tolist()
+            headers = []
+            values = []
+            k = 0
+            while True:
+                if offsets is not None:
+                    if k == len(offsets):
+                        break
+                    f.seek(offsets[k])
+                    k += 1
+                line = f.readline()
+                if not line:
+                    break
+                if header_columns:
+                    headers.append(line.split())
+                if with_values:
+                    if self.dims == 1:
+                        iteration_values = numpy.fromstring(f.readline(), sep=' ')
+                    else:
+                        iteration_values = numpy.array([numpy.fromstring(f.readline(), sep=' ') for _ in range(0, self.dims)])
+                    values.append(iteration_values if states is None else iteration_values[..., states])
+                if max(len(headers), len(values)) == batch_size:
+                    yield self.__csv_batch__(headers, values, header_columns, positions, with_values)
+                    headers = []
+                    values = []
+            if headers or values:
+                yield self.__csv_batch__(headers, values, header_columns, positions, with_values)
+
+    def __csv_batch__(self, headers, values, header_columns, positions, with_values):
+        batch = {}
+        for column in header_columns:
+            dtype = '<i8' if column == 'number' else '<f8'
+            batch[column] = numpy.array([header[positions[column]] for header in headers], dtype=dtype)
+        if with_values:
+            batch['values'] = numpy.array(values)
+        return batch
+
+    def load_index(self):
+        if not self.__index_is_current__():
+            self.build_index()
+        return numpy.fromfile(self.index_filename, dtype=IterationStats.INDEX_DTYPE, offset=IterationStats.INDEX_HEADER.size)
+
+    def __index_is_current__(self):
+        if not os.path.exists(self.index_filename):
+            return False
+        with open(self.index_filename, 'rb') as f:
+            header = f.read(IterationStats.INDEX_HEADER.size)
+        if len(header) < IterationStats.INDEX_HEADER.size:
+            return False
+        magic, size, mtime = IterationStats.INDEX_HEADER.unpack(header)
+        stat = os.stat(self.filename)
+        return magic == IterationStats.INDEX_MAGIC and size == stat.st_size and mtime == stat.st_mtime_ns
+
+    def build_index(self):
+        # writes the index of a stats file that was written without one, or
+        # changed since
+        stat = os.stat(self.filename)
+        if self.storage == 'binary':
+            records = self.load_records()
+            index = numpy.empty(len(records), dtype=IterationStats.INDEX_DTYPE)
+            index['number'] = records['number']
+            index['offset'] = IterationStats.BINARY_HEADER.size + numpy.arange(0, len(records)) * records.dtype.itemsize
+        elif self.storage == 'compressed':
+            # the iterations of a chunk all point at the chunk, only the
+            # headers at the start of a chunk need to be decompressed
+            entries = []
+            with open(self.filename, 'rb') as f:
+                if os.path.getsize(self.filename) > 0:
+                    self.__read_compressed_header__(f)
+                while True:
+                    offset = f.tell()
+                    chunk_header = f.read(IterationStats.CHUNK_HEADER.size)
+                    if len(chunk_header) < IterationStats.CHUNK_HEADER.size:
+                        break
+                    count, length = IterationStats.CHUNK_HEADER.unpack(chunk_header)
+                    data = f.read(length)
+                    if len(data) < length:
+                        break
+                    headers = zlib.decompressobj().decompress(data, count * IterationStats.CHUNK_RECORD_DTYPE.itemsize)
+                    numbers = numpy.frombuffer(headers, dtype=IterationStats.CHUNK_RECORD_DTYPE)['number']
+                    entries.extend((number, offset) for number in numbers.tolist())
+            index = numpy.array(entries, dtype=IterationStats.INDEX_DTYPE)
+        else:
+            entries = []
+            with open(self.filename, 'rb') as f:
+                offset = 0
+                while True:
+                    line = f.readline()
+                    if not line:
+                        break
+                    entries.append((int(line.split(b' ', 1)[0]), offset))
+                    offset += len(line)
+                    for _ in range(0, self.dims):
+                        offset += len(f.readline())
+            index = numpy.array(entries, dtype=IterationStats.INDEX_DTYPE)
+        with open(self.index_filename, 'wb') as f:
+            f.write(IterationStats.INDEX_HEADER.pack(IterationStats.INDEX_MAGIC, stat.st_size, stat.st_mtime_ns))
+            f.write(index.tobytes())
+
+    def get_iteration(self, iteration_number):
+        # returns (number, time, value, values) of the iteration, like the
+        # arguments of an on_iteration of load_and_run_analysis
+        index = self.load_index()
+        positions = numpy.flatnonzero(index['number'] == iteration_number)
+        if len(positions) == 0:
+            raise KeyError(iteration_number)
+        with contextlib.closing(self.__read_iterations__(index[positions[:1]])) as iterations:
+            return next(iterations)
+
+    def iter_range(self, first, last):
+        # yields the iterations numbered from first up to, not including, last
+        index = self.load_index()
+        positions = numpy.flatnonzero((index['number'] >= first) & (index['number'] < last))
+        return self.__read_iterations__(index[positions])
+
+    def __read_iterations__(self, entries):
+        offsets = entries['offset']
+        if self.storage == 'compressed':
+            with open(self.filename, 'rb') as f:
+                values_shape = self.__read_compressed_header__(f)
+                chunk_offset = None
+                for number, offset in entries.tolist():
+                    # the iterations of a chunk come one after the other, so
+                    # each chunk is decompressed once
+                    if offset != chunk_offset:
+                        f.seek(offset)
+                        headers, values = self.__read_chunk__(f, values_shape)
+                        chunk_offset = offset
+                    k = int(numpy.flatnonzero(headers['number'] == number)[0])
+                    yield number, float(headers['time'][k]), self.value_type(headers['i_value'][k]), values[k]
+            return
+        if self.storage == 'binary':
+            records = self.load_records()
+            values = records['values']
+            for k in ((offsets - IterationStats.BINARY_HEADER.size) // records.dtype.itemsize).tolist():
+                yield int(records['number'][k]), float(records['time'][k]), self.value_type(records['i_value'][k]), values[k]
+            return
+        with open(self.filename, 'rb') as f:
+            for offset in offsets.tolist():
+                f.seek(offset)
+                iteration_info = f.readline().split()
+                if self.dims == 1:
+                    values = numpy.fromstring(f.readline(), sep=' ')
+                else:
+                    values = numpy.array([numpy.fromstring(f.readline(), sep=' ') for _ in range(0, self.dims)])
+                yield int(iteration_info[0]), float(iteration_info[1]), self.value_type(iteration_info[2].decode()), values
+
     class WriteThread(Thread):
 
-        def __init__(self, filename, dims):
+        # the number of iterations that may wait to be written before write
+        # blocks the caller
+        MAX_PENDING = 64
+        # how often, in seconds, a blocked caller checks that run is still
+        # writing
+        PUT_TIMEOUT = 0.1
+
+        def __init__(self, filename, dims, storage='csv', max_pending=MAX_PENDING, index_filename=None, keyframe_interval=64):
             super().__init__()
-            self.write_queue = Queue()
+            self.write_queue = Queue(maxsize=max_pending)
             self.filename = filename
+            self.index_filename = index_filename
             self.running = True
             self.dims = dims
+            self.storage = storage
+            self.keyframe_interval = keyframe_interval
+            # the iterations of the chunk being filled and its offset
+            self.__chunk = []
+            self.__chunk_offset = 0
+            # the index entries of the iterations written since the last flush
+            self.__entries = []
+            # the error that stopped run, see check_error
+            self.error = None
 
         def done(self):
+            # None tells run that nothing follows
             self.running = False
+            self.__put__(None)
 
         def write(self, iteration_number, iteration_time, iteration_value, values):
-            self.write_queue.put((iteration_number, iteration_time, iteration_value, values))
-        
-        def run(self):
-            while self.running or not self.write_queue.empty():
+            self.__put__((iteration_number, iteration_time, iteration_value, values))
+
+        def check_error(self):
+            # raises the error that stopped run, if there was one
+            if self.error is not None:
+                raise self.error
+
+        def __put__(self, item):
+            # queues item for run, raising the error that stopped run instead
+            # of waiting forever for it to make room
+            while True:
+                self.check_error()
+                if not self.is_alive():
+                    raise RuntimeError("The stats of '{}' are not being written.".format(self.filename))
                 try:
-                    iteration_number, iteration_time, iteration_value, values = self.write_queue.get(timeout=1)
-                except Empty:
-                    continue
+                    self.write_queue.put(item, timeout=self.PUT_TIMEOUT)
+                    return
+                except Full:
+                    pass
 
-                with open(self.filename, 'a', newline='') as f:
-                    writer = csv.writer(f, delimiter=' ')
-                    writer.writerow([iteration_number, iteration_time, iteration_value])
-                    if self.dims == 1:
-                        writer.writerow(values)
-                    else:
-                        for d in range(0, self.dims):
-                            writer.writerow(values[d])
+        def run(self):
+            # an error stops the writing, and is raised in the caller of
+            # write, done or IterationStats.done_writing
+            try:
+                self.__write_queued__()
+            except BaseException as error:
+                self.error = error
+
+        def __write_queued__(self):
+            # both formats are written as bytes, so that the offsets of the
+            # iterations are known for the index
+            f = open(self.filename, 'ab')
+            if self.storage == 'binary':
+                write_iteration = functools.partial(self.__write_record__, f)
+            elif self.storage == 'compressed':
+                write_iteration = functools.partial(self.__add_to_chunk__, f)
+            else:
+                rows = io.StringIO(newline='')
+                write_iteration = functools.partial(self.__write_rows__, f, rows, csv.writer(rows, delimiter=' '))
+            index = None
+            if self.index_filename is not None:
+                index = open(self.index_filename, 'wb')
+                index.write(IterationStats.INDEX_HEADER.pack(IterationStats.INDEX_MAGIC, 0, 0))
+            with f, contextlib.closing(index) if index is not None else contextlib.nullcontext():
+                finished = False
+                while not finished:
+                    # write whatever is waiting together, then flush once
+                    batch = [self.write_queue.get()]
+                    while batch[-1] is not None:
+                        try:
+                            batch.append(self.write_queue.get_nowait())
+                        except Empty:
+                            break
+                    if batch[-1] is None:
+                        finished = True
+                        batch.pop()
+                    for iteration in batch:
+                        write_iteration(*iteration)
+                    self.__flush__(f, index)
+                if self.__chunk:
+                    self.__write_chunk__(f)
+                    self.__flush__(f, index)
+
+        def __flush__(self, f, index):
+            # the index only gets the iterations that are in the stats file,
+            # and then the size and time of the stats file it is valid for
+            f.flush()
+            if index is not None:
+                index.write(numpy.array(self.__entries, dtype=IterationStats.INDEX_DTYPE).tobytes())
+                stat = os.fstat(f.fileno())
+                index.seek(0)
+                index.write(IterationStats.INDEX_HEADER.pack(IterationStats.INDEX_MAGIC, stat.st_size, stat.st_mtime_ns))
+                index.seek(0, os.SEEK_END)
+                index.flush()
+            self.__entries = []
+
+        def __write_rows__(self, f, rows, writer, iteration_number, iteration_time, iteration_value, values):
+            rows.seek(0)
+            rows.truncate()
+            writer.writerow([iteration_number, iteration_time, iteration_value])
+            # formatting python numbers is a lot faster than numpy scalars
+            values = numpy.asarray(values).tolist()
+            if self.dims == 1:
+                writer.writerow(values)
+            else:
+                writer.writerows(values[d] for d in range(0, self.dims))
+            self.__entries.append((int(iteration_number), f.tell()))
+            f.write(rows.getvalue().encode())
+
+        def __write_record__(self, f, iteration_number, iteration_time, iteration_value, values):
+            if f.tell() == 0:
+                n = values.shape[-1]
+                f.write(IterationStats.BINARY_HEADER.pack(IterationStats.BINARY_MAGIC, self.dims, n))
+            self.__entries.append((int(iteration_number), f.tell()))
+            f.write(IterationStats.BINARY_RECORD_HEADER.pack(int(iteration_number), iteration_time, iteration_value))
+            f.write(values.tobytes())
+
+        def __add_to_chunk__(self, f, iteration_number, iteration_time, iteration_value, values):
+            if f.tell() == 0:
+                n = values.shape[-1]
+                f.write(IterationStats.COMPRESSED_HEADER.pack(IterationStats.COMPRESSED_MAGIC, self.dims, n, self.keyframe_interval))
+            if not self.__chunk:
+                self.__chunk_offset = f.tell()
+            self.__chunk.append((int(iteration_number), iteration_time, iteration_value, values))
+            if len(self.__chunk) == self.keyframe_interval:
+                self.__write_chunk__(f)
+
+        def __write_chunk__(self, f):
+            headers = numpy.array([iteration[:3] for iteration in self.__chunk], dtype=IterationStats.CHUNK_RECORD_DTYPE)
+            bits = numpy.array([iteration[3] for iteration in self.__chunk], dtype='<f8').reshape(len(self.__chunk), -1).view('<u8')
+            # consecutive value vectors share most of their high bytes, which
+            # xor to runs of zeros once the bytes are grouped by significance
+            deltas = bits.copy()
+            deltas[1:] ^= bits[:-1]
+            planes = deltas[:, :, numpy.newaxis].view(numpy.uint8).transpose(2, 0, 1)
+            data = zlib.compress(headers.tobytes() + numpy.ascontiguousarray(planes).tobytes(), 1)
+            f.write(IterationStats.CHUNK_HEADER.pack(len(self.__chunk), len(data)))
+            f.write(data)
+            # the iterations of the chunk are indexed once it is written
+            self.__entries.extend((iteration[0], self.__chunk_offset) for iteration in self.__chunk)
+            self.__chunk = []
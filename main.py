@@ -37,6 +37,7 @@ def run_forest():
 def run_value_iteration_forest(S, r1, r2):
     forest = WrappedForest(S, r1, r2)
     transitions, reward = mdptoolbox.example.forest(S, r1, r2)
+    model = cmdptoolbox.mdp.CompiledMDP(transitions, reward)
     for gamma in numpy.linspace(0.5, 1.0, num=11):
         if gamma == 1.0:
             gamma = 0.99
@@ -47,7 +48,7 @@ def run_value_iteration_forest(S, r1, r2):
             print('[{}]:\t{}'.format(iteration, variation))
 
         print('gamma={}'.format(gamma))
-        vi = cmdptoolbox.mdp.ValueIteration(transitions, reward, gamma, epsilon=0.0001, max_iter=10000, skip_check=True)
+        vi = cmdptoolbox.mdp.ValueIteration(model, None, gamma, epsilon=0.0001, max_iter=10000)
         vi.setVerbose()
         vi.setPrint(write_vi_stats)
         stats.start_writing()
@@ -91,7 +92,7 @@ def run_q_learning_forest(S, r1, r2):
     n_episodes = 10000
     how_often = n_episodes / 100
 
-    stats = IterationStats('stats/ql_forest.csv', dims=2)
+    stats = IterationStats('stats/ql_forest.csv', dims=QLearning.get_max_actions(forest))
     
     def on_episode(episode, time, q_learner, q):
         forest.print_policy(print, q_learner.get_policy())
@@ -112,7 +113,7 @@ def run_q_learning_forest(S, r1, r2):
     forest.print_policy(print, q_l.get_policy())
     print('took {} s'.format(time.time() - start))
 
-    stats = IterationStats('stats/ql_forest.csv', dims=2)
+    stats = IterationStats('stats/ql_forest.csv', dims=QLearning.get_max_actions(forest))
     analysis.create_iteration_value_graph(stats, 'average Q', 'Average Q for each iteration on Forest Q Learning', 'forest_results')
 
 def run_grid_world():
@@ -123,9 +124,12 @@ def run_grid_world():
     #transitions = GridWorld.read_transition_matrix_file('simple_grid_t_matrix.csv')
     transitions = world.get_transition_matrix(save_to='simple_grid_t_matrix.csv')
     reward = world.get_reward_matrix()
+    # the compiled model and the verdict of its check are cached so that
+    # later runs only load them
+    model = cmdptoolbox.mdp.CompiledMDP.fromCache('mdp_cache', transitions, reward)
 
-    run_value_iteration_grid_world(world, transitions, reward)
-    run_policy_iteration_grid_world(world, transitions, reward)
+    run_value_iteration_grid_world(world, model)
+    run_policy_iteration_grid_world(world, model)
     compare_different_gamma_policies(world, transitions, reward)
     get_graphs_and_time_stats_grid_world_mdp(world, transitions)
     find_converged_policy(world, transitions)
@@ -133,28 +137,35 @@ def run_grid_world():
     run_q_learning_grid_world()
     get_graph_q_learning()
 
-def run_value_iteration_grid_world(world, transitions, reward):
+def run_value_iteration_grid_world(world, model):
     
-    def write_vi_stats(vi_iter, iteration, time, variation):
-        stats.save_iteration(iteration, time, variation, vi_iter.V)
-        print('[{}]:\t{}'.format(iteration, variation))
-
-    for gamma in numpy.linspace(0.8, 0.99, num=20):
-        stats = IterationStats('stats/vi_simple_grid_{}.csv'.format(str(gamma).replace('.', '-')))
-
-        vi = cmdptoolbox.mdp.ValueIteration(transitions, reward, gamma, epsilon=0.0001, max_iter=10000, skip_check=True)
-        vi.setVerbose()
-        vi.setPrint(write_vi_stats)
+    def write_vi_stats(stats):
+        def write(vi_iter, iteration, time, variation):
+            stats.save_iteration(iteration, time, variation, vi_iter.V)
+            print('[{}]({}):\t{}'.format(iteration, vi_iter.discount, variation))
+        return write
+
+    gammas = numpy.linspace(0.8, 0.99, num=20)
+    all_stats = [IterationStats('stats/vi_simple_grid_{}.csv'.format(str(gamma).replace('.', '-'))) for gamma in gammas]
+
+    # all the discounts are solved together, so the time of an iteration is
+    # the time of the batched iteration of all the discounts still running
+    vi = cmdptoolbox.mdp.ValueIterationMultiDiscount(model, None, gammas, epsilon=0.0001, max_iter=10000)
+    vi.setVerbose()
+    vi.setPrint([write_vi_stats(stats) for stats in all_stats])
+    for stats in all_stats:
         stats.start_writing()
-        vi.run()
+    vi.run()
+    for stats in all_stats:
         stats.done_writing()
-        print('found in {} iterations'.format(vi.iter))
-        print('took {}'.format(vi.time))
-        world.print_policy(print, vi.policy)
-        last_policy = vi.policy
-    return last_policy
+    for gamma, iterations, time, policy in zip(gammas, vi.iterations, vi.times, vi.policy):
+        print('gamma={}'.format(gamma))
+        print('found in {} iterations'.format(iterations))
+        print('took {}'.format(time))
+        world.print_policy(print, policy)
+    return vi.policy[-1]
 
-def run_policy_iteration_grid_world(world, transitions, reward):
+def run_policy_iteration_grid_world(world, model):
 
     def write_pi_stats(pi_iter, iteration, time, variation):
         stats.save_iteration(iteration, time, variation, pi_iter.policy)
@@ -164,7 +175,7 @@ def run_policy_iteration_grid_world(world, transitions, reward):
         if gamma == 1.0:
             gamma = 0.99
         stats = IterationStats('stats/pi_simple_grid_{}.csv'.format(str(gamma).replace('.', '-')))
-        pi = cmdptoolbox.mdp.PolicyIteration(transitions, reward, gamma, max_iter=1000, skip_check=True)
+        pi = cmdptoolbox.mdp.PolicyIteration(model, None, gamma, max_iter=1000, eval_type='sparse')
 
         print("set up before run")
         pi.setVerbose()
@@ -183,7 +194,7 @@ def run_q_learning_grid_world():
     n_episodes = 500000
     how_often = n_episodes / 500
 
-    stats = IterationStats('stats/ql_simple_grid.csv', dims=5)
+    stats = IterationStats('stats/ql_simple_grid.csv', dims=QLearning.get_max_actions(world))
 
     def on_update(state, action, next_state, q_learner):
         #print('[{},{}] - {} -> [{},{}]'.format(state.x, state.y, action[0], next_state.x, next_state.y))
@@ -199,29 +210,17 @@ def run_q_learning_grid_world():
             goal_state = state
             break
 
-    def initialize_toward_goal(state: GridWorldTile):
-        actions = state.get_actions()
-        if len(actions) == 0:
-            return []
-        diff_x = goal_state.x - state.x
-        diff_y = goal_state.y - state.y
-        best_value = 0.1
-        if len(actions) == 5 and actions[4][0].startswith('get treasure'):
-            best_action = actions[4][0]
-        elif abs(diff_x) >= abs(diff_y):
-            if diff_x > 0:
-                best_action = 'move east'
-            else:
-                best_action = 'move west'
-        else:
-            if diff_y < 0:
-                best_action = 'move north'
-            else:
-                best_action = 'move south'
-        values = [-0.1] * len(actions)
-        for i, action in enumerate(actions):
-            if action[0] == best_action:
-                values[i] = best_value
+    def initialize_toward_goal(states, valid):
+        # the actions of a tile are north, east, south, west and then the
+        # treasure action, if any
+        diff_x = goal_state.x - numpy.array([state.x for state in states])
+        diff_y = goal_state.y - numpy.array([state.y for state in states])
+        get_treasure = numpy.array([len(actions) == 5 and actions[4][0].startswith('get treasure') for actions in (state.get_actions() for state in states)], dtype=bool)
+        best_action = numpy.where(diff_y < 0, 0, 2)
+        best_action = numpy.where(numpy.abs(diff_x) >= numpy.abs(diff_y), numpy.where(diff_x > 0, 1, 3), best_action)
+        best_action = numpy.where(get_treasure, 4, best_action)
+        values = numpy.full(valid.shape, -0.1)
+        values[numpy.arange(len(states)), numpy.minimum(best_action, valid.shape[1] - 1)] = 0.1
         return values
 
     gamma = 0.99
@@ -260,7 +259,8 @@ def find_converged_policy(world, transitions):
     print(equal_iters)
 
 def get_graph_q_learning():
-    stats = IterationStats('stats/ql_simple_grid.csv', dims=5)
+    world = GridWorld('simple_grid.txt', -0.01, include_treasure=False)
+    stats = IterationStats('stats/ql_simple_grid.csv', dims=QLearning.get_max_actions(world))
     analysis.create_iteration_value_graph(stats, 'average Q', 'Average Q for each iteration on Grid World Q Learning', 'grid_world_results/ql')
 
 if __name__ == "__main__":
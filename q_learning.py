@@ -1,10 +1,28 @@
-from mdp import MDP, MDPState
+from mdp import MDP
+import inspect
 import random
 import numpy
 import time
 
 
 class QLearning:
+    """Tabular Q-learning on the states and actions of an MDP.
+
+    The states are numbered by their position in mdp.get_states() and the
+    actions of a state by their position in its get_actions(); A_max is the
+    largest number of actions of any state.
+
+    initializer(states, valid) is called once when run starts with that list
+    of states and the (S, A_max) boolean mask of the actions each state has,
+    and returns the (S, A_max) initial Q values. The values of the actions a
+    state does not have are ignored. An initializer(state) that takes one
+    state is called for each state instead, and returns the initial values of
+    its actions.
+
+    on_episode(episode, time, q_learner, q) gets q as an (A_max, S) numpy
+    array with NaN for the actions a state does not have, see get_q_values.
+    IterationStats that save q need dims=get_max_actions(mdp).
+    """
     # Largely based off of this implementation: https://github.com/ankonzoid/LearningX/blob/master/classical_RL/gridworld/gridworld.py
 
     def __init__(self, mdp: MDP, epsilon_start, epsilon_minimum, gamma, on_update=None, on_episode=None, initializer=None, start_at_0=False, alpha=None, is_done=None, every_n_episode=10, print_n_episodes=100):
@@ -12,9 +30,15 @@ class QLearning:
         self.epsilon_start = epsilon_start
         self.epsilon_minimum = epsilon_minimum
         self.gamma = gamma
-        self.Q = {}
+        # Q[i, a] is the value of action a in the state i of mdp.get_states(),
+        # valid[i, a] is False for the actions that state i does not have, and
+        # their values are -inf
+        self.Q = None
+        self.valid = None
         self.on_update = on_update
         self.on_episode = on_episode
+        # initializer(states, valid) returns the (S, A_max) initial Q values,
+        # or initializer(state) the values of the actions of state
         self.initializer = initializer
         self.start_at_0 = start_at_0
         self.alpha = alpha
@@ -22,96 +46,185 @@ class QLearning:
         self.is_done = is_done
         self.every_n_episode = every_n_episode
         self.print_n_episodes = print_n_episodes
+        self.states = []
+        self.actions = []
+        self.n_actions = None
+        self.__state_index = {}
+        # the compiled transitions, see __compile_transitions__
+        self.__rowptr = []
+        self.__next_index = []
+        self.__reward = []
+        self.__alias_prob = []
+        self.__alias = []
+        # uniform random numbers drawn a block at a time, see __uniform__
+        self.block_size = 65536
+        self.__uniforms = []
+        self.__uniform_i = 0
+
+    def __setup_q__(self):
+        self.states = list(self.mdp.get_states())
+        self.actions = [state.get_actions() for state in self.states]
+        # the states are looked up by identity, which does not need their hash
+        self.__state_index = {id(state): i for i, state in enumerate(self.states)}
+        self.n_actions = numpy.array([len(actions) for actions in self.actions], dtype=int)
+        a_max = max(1, self.n_actions.max(initial=0))
+        self.valid = numpy.arange(a_max) < self.n_actions[:, numpy.newaxis]
+        if self.initializer is None:
+            self.Q = numpy.zeros(self.valid.shape)
+        elif len(inspect.signature(self.initializer).parameters) == 1:
+            # an initializer of the values of the actions of one state
+            self.Q = numpy.zeros(self.valid.shape)
+            for i, state in enumerate(self.states):
+                self.Q[i, :self.n_actions[i]] = self.initializer(state)
+        else:
+            self.Q = numpy.array(self.initializer(self.states, self.valid), dtype=float).reshape(self.valid.shape)
+        self.Q[~self.valid] = -numpy.inf
+        self.__compile_transitions__()
+
+    def __compile_transitions__(self):
+        # The transitions of action a in state i are the entries
+        # rowptr[i * A_max + a] to rowptr[i * A_max + a + 1] - 1 of the
+        # next state indices, their rewards and the alias table of their
+        # probabilities. The actions a state does not have have no entries.
+        a_max = self.valid.shape[1]
+        self.__rowptr = [0]
+        self.__next_index = []
+        self.__reward = []
+        self.__alias_prob = []
+        self.__alias = []
+        for i, state in enumerate(self.states):
+            for action_i in range(0, a_max):
+                if action_i < self.n_actions[i]:
+                    transitions = self.actions[i][action_i][1]
+                    next_indices = [i if t[1] is None else self.get_state_index(t[1]) for t in transitions]
+                    self.__next_index.extend(next_indices)
+                    self.__reward.extend(self.states[j].get_reward(state, action_i) for j in next_indices)
+                    alias_prob, alias = __build_alias_table__([t[0] for t in transitions])
+                    self.__alias_prob.extend(alias_prob)
+                    self.__alias.extend(alias)
+                self.__rowptr.append(len(self.__next_index))
+
+    def __uniform__(self):
+        if self.__uniform_i == len(self.__uniforms):
+            self.__uniforms = numpy.random.random(self.block_size).tolist()
+            self.__uniform_i = 0
+        u = self.__uniforms[self.__uniform_i]
+        self.__uniform_i += 1
+        return u
+
+    def get_state_index(self, state):
+        i = self.__state_index.get(id(state))
+        if i is None:
+            i = self.states.index(state)
+        return i
+
+    def get_q_values(self):
+        # the (A_max, S) Q values with NaN for the actions a state does not have
+        return numpy.where(self.valid, self.Q, numpy.nan).T
+
+    @staticmethod
+    def get_max_actions(mdp):
+        # A_max of mdp, the number of rows of the Q values that on_episode gets
+        return max(1, max((len(state.get_actions()) for state in mdp.get_states()), default=0))
 
     def run(self, n_episodes):
-        for state in self.mdp.get_states():
-            if self.initializer is None:
-                self.Q[state] = [0] * len(state.get_actions())
-            else:
-                self.Q[state] = self.initializer(state)
-        non_terminal_states = []
-        for state in self.mdp.get_states():
-            if len(state.get_actions()) > 0:
-                non_terminal_states.append(state)
+        self.__setup_q__()
+        non_terminal_states = numpy.flatnonzero(self.n_actions > 0)
         total_start = time.time()
         for episode in range(0, n_episodes):
             start = time.time()
             done = False
             if self.start_at_0 or random.random() < 0.25 + 0.75 * episode / n_episodes:
-                state = self.mdp.get_states()[0]
+                i = 0
             else:
-                state = numpy.random.choice(non_terminal_states)
+                i = numpy.random.choice(non_terminal_states)
             if self.alpha is None:
                 alpha = 1.0 / (episode + 1)
             else:
                 alpha = self.alpha
-            states = []
             while not done:
-                action, action_i = self.epsilon_greedy_next_action(state)
-                next_state = self.action_step(state, action)
+                state = self.states[i]
+                action, action_i = self.epsilon_greedy_next_action(i)
+                j, reward = self.sample_transition(i, action_i)
+                next_state = self.states[j]
 
-                if len(next_state.get_actions()) == 0 or (self.is_done is not None and self.is_done(state, action_i, next_state)):
+                if self.n_actions[j] == 0 or (self.is_done is not None and self.is_done(state, action_i, next_state)):
                     done = True
-                
-                states.append((state, action_i, next_state))
-                self.update_q(alpha, state, action_i, next_state, next_state.get_reward(state, action_i))
+
+                self.update_q(alpha, i, action_i, j, reward)
 
                 if self.on_update is not None:
                     self.on_update(state, action, next_state, self)
                 else:
                     print('.', end='', flush=True)
-                state = next_state
-            # update Q
-            # for state, action_i, next_state in reversed(states):
-            #     self.update_q(alpha, state, action_i, next_state, next_state.get_reward(state, action_i))
+                i = j
 
             self.epsilon = self.epsilon_minimum + (self.epsilon_start - self.epsilon_minimum) / (2 * numpy.log2(episode + 1) + 1)
             if episode % self.print_n_episodes == 0 or episode % self.every_n_episode == 0 or episode == n_episodes - 1:
-                q = [[] for _ in range(0, 5)]
-                for s in self.Q.values():
-                    for i in range(0, 5):
-                        if i < len(s):
-                            q[i].append(s[i])
-                        else:
-                            q[i].append(numpy.nan)
-                print('\nEpisode[{}]: average Q: {}, alpha: {}, epsilon: {}, time elapsed: {}'.format(episode, numpy.nanmean(numpy.nanmax(q, axis=0)), alpha, self.epsilon, time.time() - total_start))
+                has_actions = self.n_actions > 0
+                average_q = self.Q[has_actions].max(axis=1).mean() if has_actions.any() else numpy.nan
+                print('\nEpisode[{}]: average Q: {}, alpha: {}, epsilon: {}, time elapsed: {}'.format(episode, average_q, alpha, self.epsilon, time.time() - total_start))
                 if self.on_episode is not None and (episode % self.every_n_episode == 0 or episode == n_episodes - 1):
-                    self.on_episode(episode, time.time() - start, self, q)
+                    self.on_episode(episode, time.time() - start, self, self.get_q_values())
 
     def get_policy(self):
-        policy = []
-        for state in self.mdp.get_states():
-            q_s = self.Q[state]
-            if len(q_s) > 0:
-                policy.append(numpy.argmax(q_s))
-            else:
-                policy.append(0)
-        return policy
-                
-    def update_q(self, alpha, state, action_i, next_state, reward):
-        if len(self.Q[next_state]) == 0:
+        # the states without actions have an all -inf row, so their policy is 0
+        return self.Q.argmax(axis=1).tolist()
+
+    def update_q(self, alpha, i, action_i, j, reward):
+        if self.n_actions[j] == 0:
             update = reward
         else:
-            update = reward + self.gamma * max(self.Q[next_state])
-        self.Q[state][action_i] = (1 - alpha) * self.Q[state][action_i] + alpha * update
+            update = reward + self.gamma * self.Q[j].max()
+        self.Q[i, action_i] = (1 - alpha) * self.Q[i, action_i] + alpha * update
 
-    def epsilon_greedy_next_action(self, state: MDPState):
-        actions = state.get_actions()
-        if random.uniform(0, 1) < self.epsilon:
-            action_i = numpy.random.randint(0, len(actions))
+    def epsilon_greedy_next_action(self, i):
+        actions = self.actions[i]
+        if self.__uniform__() < self.epsilon:
+            action_i = int(self.__uniform__() * len(actions))
         else:
-            q_s = self.Q[state]
-            indices = numpy.flatnonzero(q_s == numpy.max(q_s))
-            action_i = numpy.random.choice(indices)
+            q_s = self.Q[i].tolist()
+            q_max = max(q_s)
+            indices = [a for a, q in enumerate(q_s) if q == q_max]
+            action_i = indices[int(self.__uniform__() * len(indices))] if len(indices) > 1 else indices[0]
         return actions[action_i], action_i
 
+    def sample_transition(self, i, action_i):
+        # returns the index of the next state and the reward of the transition
+        row = i * self.valid.shape[1] + action_i
+        start = self.__rowptr[row]
+        x = self.__uniform__() * (self.__rowptr[row + 1] - start)
+        k = int(x)
+        # the fraction of x is uniform too, and chooses between the entry and
+        # its alias
+        if x - k >= self.__alias_prob[start + k]:
+            k = self.__alias[start + k]
+        return self.__next_index[start + k], self.__reward[start + k]
+
     def action_step(self, state, action):
-        next_states = []
-        probabilities = []
-        for transition in action[1]:
-            if transition[1] is None:
-                next_states.append(state)
-            else:
-                next_states.append(transition[1])
-            probabilities.append(transition[0])
-        return numpy.random.choice(next_states, p=probabilities)
+        i = self.get_state_index(state)
+        j, reward = self.sample_transition(i, self.actions[i].index(action))
+        return self.states[j]
+
+
+def __build_alias_table__(probabilities):
+    # Vose's alias method: entry k is taken with probability alias_prob[k] and
+    # alias[k] otherwise, after choosing k uniformly
+    n = len(probabilities)
+    total = sum(probabilities)
+    scaled = [p * n / total for p in probabilities]
+    alias_prob = [1.0] * n
+    alias = list(range(0, n))
+    small = [k for k in range(0, n) if scaled[k] < 1.0]
+    large = [k for k in range(0, n) if scaled[k] >= 1.0]
+    while small and large:
+        k = small.pop()
+        l = large.pop()
+        alias_prob[k] = scaled[k]
+        alias[k] = l
+        scaled[l] = scaled[l] + scaled[k] - 1.0
+        if scaled[l] < 1.0:
+            small.append(l)
+        else:
+            large.append(l)
+    return alias_prob, alias
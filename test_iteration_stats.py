@@ -0,0 +1,43 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import numpy
+from iteration_stats import IterationStats
+
+
+class WriteThreadErrorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_writer_error_is_raised_in_the_caller(self):
+        # value vectors of different lengths can't be put in one chunk, so the
+        # writer fails on the first chunk while the caller keeps writing more
+        # iterations than the queue holds
+        stats = IterationStats(os.path.join(self.directory, 'stats'), storage='compressed', keyframe_interval=2)
+        stats.start_writing()
+        errors = []
+
+        def save():
+            try:
+                for i in range(IterationStats.WriteThread.MAX_PENDING * 4):
+                    stats.save_iteration(i, 0.0, 0.0, numpy.zeros(3 + i % 2))
+                stats.done_writing()
+            except ValueError as error:
+                errors.append(error)
+
+        caller = threading.Thread(target=save, daemon=True)
+        caller.start()
+        caller.join(30)
+        self.assertFalse(caller.is_alive(), 'the caller is blocked on the stopped writer')
+        self.assertEqual(len(errors), 1)
+        self.assertFalse(stats.write_thread.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()